@@ -0,0 +1,333 @@
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from scipy.special import ndtr
+
+from model_io import DEFAULT_CHUNK_SIZE, MODEL_FILE, iter_batches, load_level_2_block
+
+
+# Demographic flags are 0/1 after clean_binary() in train_model.py, so their
+# reference is a Bernoulli(p = scaler_mean) rather than a Gaussian.
+BINARY_FEATURES = ('gender', 'jundice', 'austim')
+
+# Fixed-resolution sketch in reference z-units: 0.1 sigma bins over [-6, 6]
+# plus one underflow and one overflow bin. Same edges for every monitor, so
+# sketches merge by adding counts. train_model.py exports the training
+# matrix's histogram on these edges as level_2_model.drift_reference.
+Z_LIMIT = 6.0
+Z_STEP = 0.1
+Z_EDGES = np.round(np.arange(-Z_LIMIT, Z_LIMIT + Z_STEP / 2, Z_STEP), 6)
+N_Z_BINS = len(Z_EDGES) + 1
+
+# PSI uses coarser half-sigma buckets that line up with the fine edges above
+PSI_Z_EDGES = np.array([-2.0, -1.5, -1.0, -0.5, 0.0, 0.5, 1.0, 1.5, 2.0])
+PSI_EPS = 1e-4
+PSI_WARN = 0.1
+PSI_ALERT = 0.25
+
+RISK_BINS = 20
+
+REPORT_QUANTILES = (0.05, 0.5, 0.95)
+
+
+
+
+
+def z_histogram(Z):
+    # Per-column counts of an already-scaled matrix on Z_EDGES, NaNs skipped.
+    # One bincount for all columns: offset each column's bin index.
+    Z = np.asarray(Z, dtype=float)
+    valid = ~np.isnan(Z)
+    bins = np.searchsorted(Z_EDGES, Z, side='right')
+    offsets = np.arange(Z.shape[1]) * N_Z_BINS
+    flat = (bins + offsets)[valid]
+    return np.bincount(flat, minlength=Z.shape[1] * N_Z_BINS).reshape(Z.shape[1], N_Z_BINS)
+
+
+def drift_reference(Z):
+    return {'z_limit': Z_LIMIT, 'z_step': Z_STEP, 'counts': z_histogram(Z).tolist()}
+
+
+def load_reference(model_file=MODEL_FILE):
+    l2 = load_level_2_block(model_file)
+    ref_hist = None
+    reference = l2.get('drift_reference')
+    if reference is not None:
+        if reference['z_limit'] != Z_LIMIT or reference['z_step'] != Z_STEP:
+            raise ValueError(f"{model_file} drift_reference uses different z bins; retrain to refresh it")
+        ref_hist = reference['counts']
+    return (l2['feature_names'], np.asarray(l2['scaler_mean'], dtype=float),
+            np.asarray(l2['scaler_scale'], dtype=float), ref_hist)
+
+
+def psi(observed, expected):
+    observed = np.maximum(observed, PSI_EPS)
+    expected = np.maximum(expected, PSI_EPS)
+    return float(np.sum((observed - expected) * np.log(observed / expected)))
+
+
+def drift_status(score):
+    if score >= PSI_ALERT:
+        return 'alert'
+    if score >= PSI_WARN:
+        return 'warn'
+    return 'ok'
+
+
+class DriftMonitor:
+    """
+    Streaming drift sketches for the Level-2 features. State is O(features),
+    independent of how many rows have been seen, and two monitors built from
+    the same reference can be merged.
+
+    PSI/KS compare against `ref_hist`, the training histogram on Z_EDGES. Model
+    files exported before drift_reference existed have none; those fall back
+    to N(0, 1) in scaled units, which over-alerts on the skewed *_risk columns.
+    """
+
+    def __init__(self, feature_names, ref_mean, ref_scale, ref_hist=None):
+        self.feature_names = list(feature_names)
+        self.ref_mean = np.asarray(ref_mean, dtype=float)
+        self.ref_scale = np.asarray(ref_scale, dtype=float)
+        self.ref_hist = None if ref_hist is None else np.asarray(ref_hist, dtype=np.int64)
+        k = len(self.feature_names)
+
+        self.rows = 0
+        self.count = np.zeros(k)
+        self.missing = np.zeros(k)
+        self.mean = np.zeros(k)
+        self.m2 = np.zeros(k)
+        self.min = np.full(k, np.inf)
+        self.max = np.full(k, -np.inf)
+        self.z_hist = np.zeros((k, N_Z_BINS), dtype=np.int64)
+
+        self.risk_features = [i for i, name in enumerate(self.feature_names) if name.endswith('_risk')]
+        self.risk_hist = np.zeros((len(self.risk_features), RISK_BINS), dtype=np.int64)
+
+    @classmethod
+    def from_model(cls, model_file=MODEL_FILE):
+        return cls(*load_reference(model_file))
+
+    def update(self, batch):
+        X = np.full((len(batch), len(self.feature_names)), np.nan)
+        for i, name in enumerate(self.feature_names):
+            if name in batch.columns:
+                X[:, i] = pd.to_numeric(batch[name], errors='coerce')
+        self.rows += len(batch)
+
+        valid = ~np.isnan(X)
+        n_b = valid.sum(axis=0).astype(float)
+        self.missing += len(batch) - n_b
+        if not n_b.any():
+            return
+
+        with np.errstate(invalid='ignore'):
+            mean_b = np.where(n_b > 0, np.nansum(X, axis=0) / np.maximum(n_b, 1), 0.0)
+        m2_b = np.nansum((X - mean_b) ** 2, axis=0)
+        self._merge_moments(n_b, mean_b, m2_b)
+        self.min = np.fmin(self.min, np.nanmin(np.where(valid, X, np.inf), axis=0))
+        self.max = np.fmax(self.max, np.nanmax(np.where(valid, X, -np.inf), axis=0))
+
+        self.z_hist += z_histogram((X - self.ref_mean) / self.ref_scale)
+
+        if self.risk_features:
+            risk = X[:, self.risk_features]
+            risk_valid = ~np.isnan(risk)
+            risk_bins = np.clip(np.nan_to_num(risk) * RISK_BINS, 0, RISK_BINS - 1).astype(np.int64)
+            offsets = np.arange(len(self.risk_features)) * RISK_BINS
+            flat = (risk_bins + offsets)[risk_valid]
+            self.risk_hist += np.bincount(flat, minlength=self.risk_hist.size).reshape(self.risk_hist.shape)
+
+    def _merge_moments(self, n_b, mean_b, m2_b):
+        # Elementwise Chan et al. merge; features can have different counts
+        total = self.count + n_b
+        safe_total = np.maximum(total, 1)
+        delta = mean_b - self.mean
+        self.mean = self.mean + delta * (n_b / safe_total)
+        self.m2 = self.m2 + m2_b + delta ** 2 * (self.count * n_b / safe_total)
+        self.count = total
+
+    def same_reference(self, other):
+        return (other.feature_names == self.feature_names
+                and np.allclose(other.ref_mean, self.ref_mean)
+                and np.allclose(other.ref_scale, self.ref_scale)
+                and (other.ref_hist is None) == (self.ref_hist is None)
+                and (self.ref_hist is None or np.array_equal(other.ref_hist, self.ref_hist)))
+
+    def merge(self, other):
+        if not self.same_reference(other):
+            raise ValueError("Cannot merge drift monitors built against different references")
+        self.rows += other.rows
+        self.missing += other.missing
+        self._merge_moments(other.count, other.mean, other.m2)
+        self.min = np.fmin(self.min, other.min)
+        self.max = np.fmax(self.max, other.max)
+        self.z_hist += other.z_hist
+        self.risk_hist += other.risk_hist
+        return self
+
+    def quantiles(self, i, qs=REPORT_QUANTILES):
+        hist = self.z_hist[i]
+        n = hist.sum()
+        if n == 0:
+            return [None] * len(qs)
+        # Bin edges in z-units; under/overflow bins are bounded by the observed extremes
+        z_min = (self.min[i] - self.ref_mean[i]) / self.ref_scale[i]
+        z_max = (self.max[i] - self.ref_mean[i]) / self.ref_scale[i]
+        edges = np.concatenate([[min(z_min, Z_EDGES[0])], Z_EDGES, [max(z_max, Z_EDGES[-1])]])
+        cdf = np.concatenate([[0.0], np.cumsum(hist) / n])
+        z_q = np.interp(qs, cdf, edges)
+        z_q = np.clip(z_q, z_min, z_max)
+        return (z_q * self.ref_scale[i] + self.ref_mean[i]).tolist()
+
+    def _distribution(self, i):
+        # Interpolated quantiles of a 0/1 flag are meaningless (p95 = 0.0025); report the rate
+        if self.feature_names[i] in BINARY_FEATURES:
+            return {'rate': round(float(self.mean[i]), 6), 'reference_rate': round(float(self.ref_mean[i]), 6)}
+        return {'quantiles': {str(q): round(v, 6) for q, v in zip(REPORT_QUANTILES, self.quantiles(i))}}
+
+    def _drift_scores(self, i):
+        name = self.feature_names[i]
+        hist = self.z_hist[i]
+        n = hist.sum()
+        if name in BINARY_FEATURES:
+            p_ref = float(np.clip(self.ref_mean[i], 0.0, 1.0))
+            p_obs = self.mean[i]
+            return psi(np.array([1 - p_obs, p_obs]), np.array([1 - p_ref, p_ref])), abs(p_obs - p_ref)
+
+        coarse_idx = np.concatenate([[0], np.searchsorted(Z_EDGES, PSI_Z_EDGES + Z_STEP / 2, side='right')])
+        observed = np.add.reduceat(hist, coarse_idx) / n
+        if self.ref_hist is not None and self.ref_hist[i].sum() > 0:
+            ref = self.ref_hist[i]
+            ref_cdf = np.cumsum(ref)[:-1] / ref.sum()
+            expected = np.add.reduceat(ref, coarse_idx) / ref.sum()
+        else:
+            ref_cdf = ndtr(Z_EDGES)
+            expected = np.diff(np.concatenate([[0.0], ndtr(PSI_Z_EDGES), [1.0]]))
+
+        # KS evaluated on the sketch's bin edges
+        ks = float(np.max(np.abs(np.cumsum(hist)[:-1] / n - ref_cdf)))
+        return psi(observed, expected), ks
+
+    def report(self):
+        features = {}
+        worst = 'ok'
+        for i, name in enumerate(self.feature_names):
+            entry = {
+                'count': int(self.count[i]),
+                'missing': int(self.missing[i]),
+            }
+            if self.count[i] > 0:
+                std = float(np.sqrt(self.m2[i] / self.count[i]))
+                psi_score, ks = self._drift_scores(i)
+                status = drift_status(psi_score)
+                entry.update({
+                    'mean': round(float(self.mean[i]), 6),
+                    'std': round(std, 6),
+                    'min': float(self.min[i]),
+                    'max': float(self.max[i]),
+                    'mean_shift_sigma': round(float((self.mean[i] - self.ref_mean[i]) / self.ref_scale[i]), 4),
+                    'std_ratio': round(float(std / self.ref_scale[i]), 4),
+                    **self._distribution(i),
+                    'psi': round(psi_score, 4),
+                    'ks': round(float(ks), 4),
+                    'status': status,
+                })
+                if status == 'alert' or (status == 'warn' and worst == 'ok'):
+                    worst = status
+            features[name] = entry
+
+        risk_histograms = {
+            self.feature_names[i].replace('_risk', ''): self.risk_hist[j].tolist()
+            for j, i in enumerate(self.risk_features)
+        }
+        return {
+            'rows': int(self.rows),
+            'status': worst,
+            'reference': 'gaussian_fallback' if self.ref_hist is None else 'training_histogram',
+            'thresholds': {'psi_warn': PSI_WARN, 'psi_alert': PSI_ALERT},
+            'features': features,
+            'risk_histograms': {'bins': RISK_BINS, 'counts': risk_histograms},
+        }
+
+    def to_dict(self):
+        return {
+            'feature_names': self.feature_names,
+            'ref_mean': self.ref_mean.tolist(),
+            'ref_scale': self.ref_scale.tolist(),
+            'ref_hist': None if self.ref_hist is None else self.ref_hist.tolist(),
+            'rows': int(self.rows),
+            'count': self.count.tolist(),
+            'missing': self.missing.tolist(),
+            'mean': self.mean.tolist(),
+            'm2': self.m2.tolist(),
+            'min': [float(v) if np.isfinite(v) else None for v in self.min],
+            'max': [float(v) if np.isfinite(v) else None for v in self.max],
+            'z_hist': self.z_hist.tolist(),
+            'risk_hist': self.risk_hist.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        monitor = cls(state['feature_names'], state['ref_mean'], state['ref_scale'], state.get('ref_hist'))
+        monitor.rows = state['rows']
+        for key in ('count', 'missing', 'mean', 'm2'):
+            setattr(monitor, key, np.asarray(state[key], dtype=float))
+        monitor.min = np.array([np.inf if v is None else v for v in state['min']])
+        monitor.max = np.array([-np.inf if v is None else v for v in state['max']])
+        monitor.z_hist = np.asarray(state['z_hist'], dtype=np.int64)
+        monitor.risk_hist = np.asarray(state['risk_hist'], dtype=np.int64)
+        return monitor
+
+
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream scored batches through Level-2 feature drift sketches.")
+    parser.add_argument('inputs', nargs='*', help="Scored batch files (.csv or .parquet), read in chunks")
+    parser.add_argument('--model', default=MODEL_FILE)
+    parser.add_argument('--state', help="Sketch state file to resume from and save back to")
+    parser.add_argument('--merge', nargs='*', default=[], help="Other sketch state files to merge in")
+    parser.add_argument('--reset-state', action='store_true',
+                        help="Start a new --state from --model instead of refusing a state built against another model")
+    parser.add_argument('--report', help="Write the drift report JSON here instead of stdout")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    monitor = DriftMonitor.from_model(args.model)
+    if args.state and os.path.exists(args.state) and not args.reset_state:
+        with open(args.state) as f:
+            saved = DriftMonitor.from_dict(json.load(f))
+        # After a retrain the saved sketches are binned against the old scaler
+        if not saved.same_reference(monitor):
+            raise SystemExit(f"{args.state} was built against a different model than {args.model}; "
+                             f"rerun with --reset-state to start a new state")
+        monitor = saved
+
+    for path in args.merge:
+        with open(path) as f:
+            monitor.merge(DriftMonitor.from_dict(json.load(f)))
+
+    for batch in iter_batches(args.inputs, args.chunk_size):
+        monitor.update(batch)
+
+    if args.state:
+        tmp_path = args.state + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(monitor.to_dict(), f)
+        os.replace(tmp_path, args.state)
+
+    report = monitor.report()
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"📄 Drift report saved to {args.report} (status: {report['status']})")
+    else:
+        print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
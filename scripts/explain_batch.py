@@ -0,0 +1,136 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from model_io import DEFAULT_CHUNK_SIZE, MODEL_FILE, iter_batches, load_level_2_block
+
+
+DEFAULT_TOP_K = 3
+
+# Defaults predictRisk in src/services/ml.js uses when a feature is missing:
+# unplayed game risks are 0.3, age falls back to 5 and the flags to 0.
+RISK_DEFAULT = 0.3
+FEATURE_DEFAULTS = {'age': 5.0, 'gender': 0.0, 'jundice': 0.0, 'austim': 0.0}
+
+
+
+
+
+def load_level_2_model(model_file=MODEL_FILE):
+    l2 = load_level_2_block(model_file)
+    return {
+        'feature_names': l2['feature_names'],
+        'coefficients': np.asarray(l2['coefficients'], dtype=np.float64),
+        'intercept': float(l2['intercept']),
+        'scaler_mean': np.asarray(l2['scaler_mean'], dtype=np.float64),
+        'scaler_scale': np.asarray(l2['scaler_scale'], dtype=np.float64),
+    }
+
+
+def feature_defaults(feature_names):
+    return np.array([RISK_DEFAULT if name.endswith('_risk') else FEATURE_DEFAULTS.get(name, 0.0)
+                     for name in feature_names])
+
+
+def impute_defaults(X, feature_names):
+    """Fills NaNs in place with predictRisk's defaults; returns the per-row count filled."""
+    missing = np.isnan(X)
+    if missing.any():
+        X[missing] = np.broadcast_to(feature_defaults(feature_names), X.shape)[missing]
+    return missing.sum(axis=1)
+
+
+def explain(X, l2, top_k=DEFAULT_TOP_K):
+    """
+    Per-feature logit contributions for a (rows x features) matrix, matching
+    predictRisk in src/services/ml.js: contribution_j = (x_j - mean_j) / scale_j * coef_j,
+    so a child at the training mean has all-zero contributions and logit = intercept.
+    X must be finite; run impute_defaults first for predictRisk's handling of gaps.
+    Returns (contributions, logit, probability, top_idx) with top_idx ordered by |contribution|.
+    """
+    contributions = (X - l2['scaler_mean']) * (l2['coefficients'] / l2['scaler_scale'])
+    logit = contributions.sum(axis=1) + l2['intercept']
+    probability = 0.5 * (1.0 + np.tanh(0.5 * logit))
+
+    magnitude = np.abs(contributions)
+    k = min(top_k, X.shape[1])
+    if k < X.shape[1]:
+        top_idx = np.argpartition(-magnitude, k - 1, axis=1)[:, :k]
+    else:
+        top_idx = np.broadcast_to(np.arange(k), (X.shape[0], k))
+    order = np.argsort(-np.take_along_axis(magnitude, top_idx, axis=1), axis=1)
+    top_idx = np.take_along_axis(top_idx, order, axis=1)
+
+    return contributions, logit, probability, top_idx
+
+
+def explanation_table(batch, l2, id_columns=(), top_k=DEFAULT_TOP_K):
+    names = l2['feature_names']
+    missing = [name for name in names if name not in batch.columns]
+    if missing:
+        raise ValueError(f"Scored batch is missing Level-2 features: {missing}")
+
+    X = batch[names].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float64, copy=True)
+    n_imputed = impute_defaults(X, names)
+    contributions, logit, probability, top_idx = explain(X, l2, top_k)
+
+    # Ids are always strings so every chunk writes the same schema
+    columns = {col: pa.array(batch[col].astype('string'), type=pa.string()) for col in id_columns}
+    columns['n_imputed'] = pa.array(n_imputed.astype(np.int8))
+    columns['logit'] = pa.array(logit.astype(np.float32))
+    columns['risk_probability'] = pa.array(probability.astype(np.float32))
+    for j, name in enumerate(names):
+        columns[f'{name}_contrib'] = pa.array(contributions[:, j].astype(np.float32))
+
+    # Driver names are dictionary-encoded: each row only stores a small index
+    name_dictionary = pa.array(names, type=pa.string())
+    top_contrib = np.take_along_axis(contributions, top_idx, axis=1)
+    for rank in range(top_idx.shape[1]):
+        columns[f'driver_{rank + 1}'] = pa.DictionaryArray.from_arrays(
+            pa.array(top_idx[:, rank].astype(np.int8)), name_dictionary)
+        columns[f'driver_{rank + 1}_contrib'] = pa.array(top_contrib[:, rank].astype(np.float32))
+
+    return pa.table(columns)
+
+
+def explain_files(inputs, output_file, model_file=MODEL_FILE, id_columns=(), top_k=DEFAULT_TOP_K,
+                  chunk_size=DEFAULT_CHUNK_SIZE):
+    l2 = load_level_2_model(model_file)
+    # The schema doesn't depend on the data, so pin it from an empty batch:
+    # every chunk is cast to it and an input with no rows still gets a file.
+    empty = pd.DataFrame({**{col: pd.Series(dtype='string') for col in id_columns},
+                          **{name: pd.Series(dtype='float64') for name in l2['feature_names']}})
+    schema = explanation_table(empty, l2, id_columns, top_k).schema
+    rows = 0
+    with pq.ParquetWriter(output_file, schema, compression='zstd') as writer:
+        for batch in iter_batches(inputs, chunk_size, string_columns=id_columns):
+            table = explanation_table(batch, l2, id_columns, top_k)
+            writer.write_table(table.cast(schema))
+            rows += table.num_rows
+    if rows:
+        print(f"💾 Explanations for {rows} rows saved to {output_file}")
+    else:
+        print(f"⚠️ No scored rows read; wrote an empty {output_file}")
+    return rows
+
+
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export per-feature Level-2 logit contributions for scored children.")
+    parser.add_argument('inputs', nargs='+', help="Scored batch files (.csv or .parquet) with Level-2 feature columns")
+    parser.add_argument('--output', required=True, help="Parquet file to write")
+    parser.add_argument('--model', default=MODEL_FILE)
+    parser.add_argument('--id-columns', nargs='*', default=[], help="Columns to carry through (e.g. user_id)")
+    parser.add_argument('--top-k', type=int, default=DEFAULT_TOP_K)
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    explain_files(args.inputs, args.output, args.model, args.id_columns, args.top_k, args.chunk_size)
+
+if __name__ == "__main__":
+    main()
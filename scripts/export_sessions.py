@@ -0,0 +1,471 @@
+import argparse
+import bisect
+import json
+import os
+import shutil
+import string
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+
+
+# Collection names must stay in sync with src/services/db.js
+SESSIONS_COLLECTION = 'game_sessions'
+METRICS_COLLECTION = 'round_metrics'
+
+EXPORT_DIR = r'DATASETS/sessions_export'
+CURSOR_FILE_NAME = '_cursor.json'
+
+DEFAULT_PAGE_SIZE = 1000
+DEFAULT_SHARDS = 8
+
+# Incremental runs re-read this far behind the previous run's watermark:
+# offline-queued writes (syncOfflineQueue) land late with client timestamps.
+DEFAULT_LOOKBACK_HOURS = 24
+
+# Firestore auto-IDs are 20 chars drawn from [0-9A-Za-z]; sorted in byte order
+# so contiguous slices of it give disjoint document-ID ranges.
+ID_ALPHABET = ''.join(sorted(string.digits + string.ascii_letters))
+
+# Same mapping as calculateGameRisks/predictRisk in src/services/ml.js
+GAME_ID_TO_KEY = {
+    'color-focus': 'color_focus',
+    'routine-sequencer': 'routine_sequencer',
+    'emotion-mirror': 'emotion_mirror',
+    'object-id': 'object_hunt',
+    'free-toy-tap': 'free_toy_tap',
+    'shape-switch': 'shape_switch',
+    'attention-call': 'attention_call',
+}
+
+# session.stats fields read by fetchUserGameStats in src/services/db.js
+SESSION_STAT_FIELDS = {
+    'mistakes': 'float64',
+    'errors': 'float64',
+    'duration': 'float64',
+    'correct': 'float64',
+    'wrong': 'float64',
+    'attempts': 'float64',
+    'completed': 'boolean',
+    'avgLatency': 'float64',
+    'objectFixationEntropy': 'float64',
+    'repetitionRate': 'float64',
+    'switchFrequency': 'float64',
+    'engagementTime': 'float64',
+    'totalTaps': 'float64',
+    'pauseCount': 'float64',
+    'responseRate': 'float64',
+    'avgResponseTime': 'float64',
+    'totalResponses': 'float64',
+    'totalCalls': 'float64',
+    'firstResponseCall': 'float64',
+    'responseType': 'string',
+}
+
+SESSION_SCHEMA = {
+    'session_id': 'string',
+    'user_id': 'string',
+    'game_id': 'string',
+    'game_key': 'string',
+    'status': 'string',
+    'score': 'float64',
+    'start_time': 'datetime64[ns, UTC]',
+    'end_time': 'datetime64[ns, UTC]',
+    **SESSION_STAT_FIELDS,
+}
+
+METRIC_SCHEMA = {
+    'metric_id': 'string',
+    'session_id': 'string',
+    'game_id': 'string',
+    'game_key': 'string',
+    'round': 'float64',
+    'correct': 'boolean',
+    'reaction_time_ms': 'float64',
+    'timestamp': 'datetime64[ns, UTC]',
+    'extra': 'string',
+}
+
+METRIC_CORE_FIELDS = {'sessionId', 'game', 'round', 'correct', 'reactionTimeMs', 'timestamp'}
+
+
+
+
+
+def to_timestamp(value):
+    # serverTimestamp() comes back as a datetime from the SDK, as
+    # {seconds, nanoseconds} from JSON exports, and offline-queued writes
+    # store ISO strings or Date.now() millis.
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    if isinstance(value, dict):
+        seconds = value.get('seconds', value.get('_seconds'))
+        if seconds is None:
+            return None
+        nanos = value.get('nanoseconds', value.get('_nanoseconds', 0)) or 0
+        return datetime.fromtimestamp(seconds + nanos / 1e9, tz=timezone.utc)
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value / 1000.0, tz=timezone.utc)
+    try:
+        ts = pd.Timestamp(value)
+    except (ValueError, TypeError):
+        return None
+    return ts.tz_localize('UTC') if ts.tzinfo is None else ts
+
+
+def to_number(value):
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return None
+
+
+def to_bool(value):
+    return value if isinstance(value, bool) else None
+
+
+def session_to_row(doc_id, data):
+    stats = data.get('stats') or {}
+    game_id = data.get('gameId')
+    row = {
+        'session_id': doc_id,
+        'user_id': data.get('userId'),
+        'game_id': game_id,
+        'game_key': GAME_ID_TO_KEY.get(game_id),
+        'status': data.get('status'),
+        'score': to_number(data.get('score')),
+        'start_time': to_timestamp(data.get('startTime')),
+        'end_time': to_timestamp(data.get('endTime')),
+    }
+    for field, dtype in SESSION_STAT_FIELDS.items():
+        value = stats.get(field)
+        if dtype == 'float64':
+            value = to_number(value)
+        elif dtype == 'boolean':
+            value = to_bool(value)
+        elif value is not None:
+            value = str(value)
+        row[field] = value
+    return row
+
+
+def metric_to_row(doc_id, data):
+    game_id = data.get('game')
+    extra = {k: v for k, v in data.items() if k not in METRIC_CORE_FIELDS}
+    return {
+        'metric_id': doc_id,
+        'session_id': data.get('sessionId'),
+        'game_id': game_id,
+        'game_key': GAME_ID_TO_KEY.get(game_id),
+        'round': to_number(data.get('round')),
+        'correct': to_bool(data.get('correct')),
+        'reaction_time_ms': to_number(data.get('reactionTimeMs')),
+        'timestamp': to_timestamp(data.get('timestamp')),
+        'extra': json.dumps(extra, default=str, sort_keys=True) if extra else None,
+    }
+
+
+# collection -> (row converter, schema, id column, timestamp columns). The
+# newest timestamp column is a document's last-modified time: sessions get
+# startTime on createGameSession and endTime on endGameSession.
+COLLECTIONS = {
+    SESSIONS_COLLECTION: (session_to_row, SESSION_SCHEMA, 'session_id', ('start_time', 'end_time')),
+    METRICS_COLLECTION: (metric_to_row, METRIC_SCHEMA, 'metric_id', ('timestamp',)),
+}
+
+
+def modified_since(row, ts_cols, since):
+    # Rows with no usable timestamp can't be tracked, so they are always kept
+    # and deduplicated by the upsert.
+    if since is None:
+        return True
+    stamps = [row[c] for c in ts_cols if row[c] is not None]
+    return not stamps or max(stamps) > since
+
+
+def to_frame(rows, schema):
+    df = pd.DataFrame(rows, columns=list(schema))
+    for col, dtype in schema.items():
+        if dtype.startswith('datetime64'):
+            df[col] = pd.to_datetime(df[col], utc=True)
+        else:
+            df[col] = df[col].astype(dtype)
+    return df
+
+
+
+
+
+class FirestoreSource:
+    """Reads pages from Firestore. Set FIRESTORE_EMULATOR_HOST to target the local emulator."""
+
+    def __init__(self, project=None):
+        try:
+            from google.cloud import firestore
+            from google.cloud.firestore_v1.base_query import FieldFilter
+        except ImportError:
+            raise SystemExit("google-cloud-firestore is required for --source firestore (pip install google-cloud-firestore)")
+        self._client = firestore.Client(project=project)
+        self._field_filter = FieldFilter
+        self._doc_id = firestore.FieldPath.document_id()
+
+    def fetch_page(self, collection, lower, upper, after, page_size):
+        coll = self._client.collection(collection)
+        q = coll.order_by(self._doc_id)
+        if after is not None:
+            q = q.where(filter=self._field_filter(self._doc_id, '>', coll.document(after)))
+        elif lower is not None:
+            q = q.where(filter=self._field_filter(self._doc_id, '>=', coll.document(lower)))
+        if upper is not None:
+            q = q.where(filter=self._field_filter(self._doc_id, '<', coll.document(upper)))
+        return [(snap.id, snap.to_dict()) for snap in q.limit(page_size).stream()]
+
+
+class FileSource:
+    """File-backed stand-in: <root>/<collection>.jsonl with one {"id": ..., "data": {...}} per line."""
+
+    def __init__(self, root):
+        self._root = root
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def _load(self, collection):
+        with self._lock:
+            if collection not in self._cache:
+                docs = []
+                path = os.path.join(self._root, f'{collection}.jsonl')
+                if os.path.exists(path):
+                    with open(path) as f:
+                        for line in f:
+                            if line.strip():
+                                record = json.loads(line)
+                                docs.append((record['id'], record.get('data', {})))
+                docs.sort(key=lambda d: d[0])
+                self._cache[collection] = ([d[0] for d in docs], docs)
+            return self._cache[collection]
+
+    def fetch_page(self, collection, lower, upper, after, page_size):
+        ids, docs = self._load(collection)
+        if after is not None:
+            start = bisect.bisect_right(ids, after)
+        else:
+            start = bisect.bisect_left(ids, lower) if lower is not None else 0
+        end = bisect.bisect_left(ids, upper) if upper is not None else len(ids)
+        return docs[start:min(end, start + page_size)]
+
+
+
+
+
+def make_shards(n_shards):
+    # Split the ID alphabet into n contiguous [lower, upper) ranges; the
+    # first and last are left open so non-auto IDs are still covered.
+    n_shards = max(1, min(n_shards, len(ID_ALPHABET)))
+    step = len(ID_ALPHABET) / n_shards
+    bounds = [ID_ALPHABET[round(i * step)] for i in range(1, n_shards)]
+    lowers = [None] + bounds
+    uppers = bounds + [None]
+    return list(zip(lowers, uppers))
+
+
+class ExportCursor:
+    """
+    Persistent export state. `watermark` holds each collection's last completed
+    run start; `run` holds the in-progress run and its per-shard doc-ID
+    positions, which are only used to resume that run after a crash.
+    """
+
+    def __init__(self, path, fresh=False):
+        self.path = path
+        self._lock = threading.Lock()
+        self.state = {'watermark': {}, 'runs': 0, 'run': None}
+        if not fresh and os.path.exists(path):
+            with open(path) as f:
+                self.state.update(json.load(f))
+
+    @property
+    def run(self):
+        return self.state['run']
+
+    def start_run(self, collections, n_shards, lookback):
+        started_at = datetime.now(timezone.utc)
+        since = {}
+        for c in collections:
+            watermark = self.state['watermark'].get(c)
+            since[c] = (datetime.fromisoformat(watermark) - lookback).isoformat() if watermark else None
+        self.state['runs'] += 1
+        self.state['run'] = {
+            'number': self.state['runs'],
+            'started_at': started_at.isoformat(),
+            'collections': list(collections),
+            'shards': n_shards,
+            'since': since,
+            'positions': {c: {} for c in collections},
+        }
+        self.save()
+
+    def get(self, collection, shard_id):
+        return self.run['positions'][collection].get(str(shard_id), {'after': None, 'page': 0, 'done': False})
+
+    def update(self, collection, shard_id, after, page, done):
+        with self._lock:
+            self.run['positions'][collection][str(shard_id)] = {'after': after, 'page': page, 'done': done}
+            self.save()
+
+    def finish_run(self):
+        for c in self.run['collections']:
+            self.state['watermark'][c] = self.run['started_at']
+        self.state['run'] = None
+        self.save()
+
+    def save(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+def write_partitions(df, collection_dir, part_name):
+    # Hive-style game_id=<id>/ partitions so readers can prune by game.
+    written = 0
+    for game_id, part in df.groupby(df['game_id'].fillna('unknown'), sort=False):
+        part_dir = os.path.join(collection_dir, f'game_id={game_id}')
+        os.makedirs(part_dir, exist_ok=True)
+        part.drop(columns=['game_id']).to_parquet(os.path.join(part_dir, f'{part_name}.parquet'), index=False)
+        written += len(part)
+    return written
+
+
+def compact_partitions(collection_dir, id_col):
+    # Upsert: fold this run's part files into each partition's data.parquet,
+    # keeping the newest copy of every document. Idempotent, so a crash
+    # mid-compaction is repaired by the next run.
+    if not os.path.isdir(collection_dir):
+        return
+    for part_dir in sorted(os.listdir(collection_dir)):
+        part_dir = os.path.join(collection_dir, part_dir)
+        parts = sorted(f for f in os.listdir(part_dir) if f.startswith('run-'))
+        if not parts:
+            continue
+        data_file = os.path.join(part_dir, 'data.parquet')
+        files = ([data_file] if os.path.exists(data_file) else []) + [os.path.join(part_dir, f) for f in parts]
+        merged = pd.concat([pd.read_parquet(f) for f in files], ignore_index=True)
+        merged = merged.drop_duplicates(subset=id_col, keep='last')
+        merged.to_parquet(data_file + '.tmp', index=False)
+        os.replace(data_file + '.tmp', data_file)
+        for f in parts:
+            os.remove(os.path.join(part_dir, f))
+
+
+def export_shard(source, collection, shard_id, bounds, cursor, output_dir, page_size):
+    to_row, schema, _, ts_cols = COLLECTIONS[collection]
+    lower, upper = bounds
+    collection_dir = os.path.join(output_dir, collection)
+    run = cursor.run
+    since = datetime.fromisoformat(run['since'][collection]) if run['since'][collection] else None
+    state = cursor.get(collection, shard_id)
+    if state['done']:
+        return 0
+
+    after, page_no, exported = state['after'], state['page'], 0
+    while True:
+        docs = source.fetch_page(collection, lower, upper, after, page_size)
+        if not docs:
+            cursor.update(collection, shard_id, after, page_no, True)
+            return exported
+
+        rows = [to_row(doc_id, data) for doc_id, data in docs]
+        rows = [row for row in rows if modified_since(row, ts_cols, since)]
+        if rows:
+            # Part name is deterministic per (run, shard, page) so a crash between
+            # the write and the cursor update just rewrites the same files on resume.
+            part_name = f"run-{run['number']:05d}-part-{shard_id:03d}-{page_no:06d}"
+            exported += write_partitions(to_frame(rows, schema), collection_dir, part_name)
+        after, page_no = docs[-1][0], page_no + 1
+        cursor.update(collection, shard_id, after, page_no, len(docs) < page_size)
+        if len(docs) < page_size:
+            return exported
+
+
+def export_collections(source, output_dir=EXPORT_DIR, collections=None, n_shards=DEFAULT_SHARDS,
+                       page_size=DEFAULT_PAGE_SIZE, fresh=False, lookback_hours=DEFAULT_LOOKBACK_HOURS):
+    """
+    One export run. The first run (or --fresh) exports everything; later runs
+    only write documents modified after the previous run's start minus the
+    lookback, and upsert them by document id. Firestore can't range-filter
+    these timestamps server-side because the app writes them as server
+    timestamps, ISO strings and Date.now() millis, so every run still pages
+    the whole collection but only converts and writes what changed.
+    """
+    collections = collections or list(COLLECTIONS)
+    os.makedirs(output_dir, exist_ok=True)
+    if fresh:
+        for c in COLLECTIONS:
+            shutil.rmtree(os.path.join(output_dir, c), ignore_errors=True)
+    cursor = ExportCursor(os.path.join(output_dir, CURSOR_FILE_NAME), fresh=fresh)
+    shards = make_shards(n_shards)
+
+    if cursor.run is not None:
+        run = cursor.run
+        if run['shards'] != len(shards):
+            raise SystemExit(f"Interrupted run {run['number']} used {run['shards']} shards; rerun with --shards {run['shards']} or --fresh")
+        if sorted(run['collections']) != sorted(collections):
+            raise SystemExit(f"Interrupted run {run['number']} covers {run['collections']}; rerun with those collections or --fresh")
+        print(f"Resuming export run {run['number']}")
+    else:
+        cursor.start_run(collections, len(shards), timedelta(hours=lookback_hours))
+    totals = {c: 0 for c in collections}
+
+    with ThreadPoolExecutor(max_workers=len(shards)) as pool:
+        futures = {
+            pool.submit(export_shard, source, c, shard_id, bounds, cursor, output_dir, page_size): c
+            for c in collections
+            for shard_id, bounds in enumerate(shards)
+        }
+        for future in as_completed(futures):
+            totals[futures[future]] += future.result()
+
+    for c in collections:
+        compact_partitions(os.path.join(output_dir, c), COLLECTIONS[c][2])
+    cursor.finish_run()
+
+    for c, n in totals.items():
+        print(f"Exported {n} new or updated documents from {c} -> {os.path.join(output_dir, c)}")
+    return totals
+
+
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export game_sessions/round_metrics to partitioned Parquet.")
+    parser.add_argument('--source', choices=['firestore', 'files'], default='firestore')
+    parser.add_argument('--input-dir', help="Directory of <collection>.jsonl files for --source files")
+    parser.add_argument('--project', help="GCP project id (defaults to the environment's)")
+    parser.add_argument('--output-dir', default=EXPORT_DIR)
+    parser.add_argument('--collections', nargs='+', choices=list(COLLECTIONS))
+    parser.add_argument('--shards', type=int, default=DEFAULT_SHARDS)
+    parser.add_argument('--page-size', type=int, default=DEFAULT_PAGE_SIZE)
+    parser.add_argument('--fresh', action='store_true', help="Drop previous output and watermarks and export everything")
+    parser.add_argument('--lookback-hours', type=float, default=DEFAULT_LOOKBACK_HOURS,
+                        help="How far behind the previous run's watermark incremental runs re-read")
+    args = parser.parse_args()
+
+    if args.source == 'files':
+        if not args.input_dir:
+            parser.error("--input-dir is required with --source files")
+        source = FileSource(args.input_dir)
+    else:
+        source = FirestoreSource(project=args.project)
+
+    export_collections(source, args.output_dir, args.collections, args.shards, args.page_size, args.fresh,
+                       args.lookback_hours)
+
+if __name__ == "__main__":
+    main()
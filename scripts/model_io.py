@@ -0,0 +1,33 @@
+import json
+import os
+
+import pandas as pd
+
+
+# Shared by the scripts that read the exported model and scored batch files
+MODEL_FILE = os.path.join(r'public/models', 'model_weights.json')
+DEFAULT_CHUNK_SIZE = 100_000
+
+
+
+
+
+def load_level_2_block(model_file=MODEL_FILE):
+    with open(model_file) as f:
+        return json.load(f)['level_2_model']
+
+
+def iter_batches(paths, chunk_size=DEFAULT_CHUNK_SIZE, string_columns=()):
+    # string_columns are read as strings in every chunk, so CSV type inference
+    # can't turn ids into float64 (nulls) or flip types between chunks.
+    for path in paths:
+        if path.endswith('.parquet'):
+            import pyarrow.parquet as pq
+            for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+                df = batch.to_pandas()
+                for col in string_columns:
+                    if col in df.columns:
+                        df[col] = df[col].astype('string')
+                yield df
+        else:
+            yield from pd.read_csv(path, chunksize=chunk_size, dtype={col: 'string' for col in string_columns})
@@ -0,0 +1,202 @@
+import multiprocessing as mp
+import traceback
+
+import numpy as np
+from scipy.optimize import minimize
+from sklearn.linear_model import LogisticRegression
+from sklearn.preprocessing import StandardScaler
+from sklearn.utils import check_X_y
+
+
+# Each worker process owns one row shard of the stacked Level-2 matrix and only
+# ever sends back O(n_features) summaries, so the coordinator never holds the
+# full dataset. Processes on one machine stand in for nodes.
+
+
+
+
+
+def _shard_worker(conn, X, y):
+    X = np.asarray(X, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    while True:
+        cmd, payload = conn.recv()
+        if cmd == 'close':
+            conn.close()
+            return
+
+        try:
+            if cmd == 'moments':
+                n = X.shape[0]
+                mean = X.mean(axis=0) if n else np.zeros(X.shape[1])
+                m2 = ((X - mean) ** 2).sum(axis=0)
+                reply = (n, mean, m2)
+
+            elif cmd == 'standardize':
+                mean, scale = payload
+                X = (X - mean) / scale
+                reply = None
+
+            elif cmd == 'loss_grad':
+                w, b = payload
+                z = X @ w + b
+                # log(1 + e^z) - y*z, written to stay finite for large |z|
+                loss = np.sum(np.logaddexp(0.0, z) - y * z)
+                residual = 0.5 * (1.0 + np.tanh(0.5 * z)) - y
+                reply = (loss, X.T @ residual, residual.sum())
+
+            else:
+                raise ValueError(f"Unknown shard command {cmd!r}")
+        except Exception:
+            conn.send(('error', traceback.format_exc()))
+        else:
+            conn.send(('ok', reply))
+
+
+class ShardPool:
+    def __init__(self, X, y, n_workers):
+        ctx = mp.get_context('spawn')
+        X = np.asarray(X, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        self.n_features = X.shape[1]
+        self._conns = []
+        self._procs = []
+        self._rows = []
+        try:
+            for idx in np.array_split(np.arange(X.shape[0]), n_workers):
+                parent, child = ctx.Pipe()
+                proc = ctx.Process(target=_shard_worker, args=(child, X[idx], y[idx]), daemon=True)
+                proc.start()
+                child.close()
+                self._conns.append(parent)
+                self._procs.append(proc)
+                self._rows.append((int(idx[0]), int(idx[-1]) + 1) if len(idx) else (0, 0))
+        except BaseException:
+            self.close()
+            raise
+
+    def _describe(self, i):
+        start, stop = self._rows[i]
+        return f"Level-2 shard {i} (rows {start}:{stop})"
+
+    def _raise_dead(self, i, cmd, cause):
+        self._procs[i].join(timeout=1)
+        raise RuntimeError(f"{self._describe(i)} died during {cmd!r} "
+                           f"(exit code {self._procs[i].exitcode})") from cause
+
+    def broadcast(self, cmd, payload=None):
+        for i, conn in enumerate(self._conns):
+            try:
+                conn.send((cmd, payload))
+            except OSError as e:
+                self._raise_dead(i, cmd, e)
+
+        results = []
+        for i, conn in enumerate(self._conns):
+            try:
+                status, reply = conn.recv()
+            except (EOFError, OSError) as e:
+                self._raise_dead(i, cmd, e)
+            if status == 'error':
+                raise RuntimeError(f"{self._describe(i)} failed during {cmd!r}:\n{reply}")
+            results.append(reply)
+        return results
+
+    def close(self):
+        # Must not raise: it runs from __exit__ while another error may be propagating
+        for conn in self._conns:
+            try:
+                conn.send(('close', None))
+            except OSError:
+                pass
+        for proc in self._procs:
+            proc.join(timeout=5)
+            if proc.is_alive():
+                proc.terminate()
+                proc.join()
+        for conn in self._conns:
+            conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def merge_moments(parts):
+    # Chan et al. pairwise merge of (count, mean, M2); avoids the
+    # cancellation you get from summing raw squares across shards.
+    n, mean, m2 = 0, None, None
+    for n_b, mean_b, m2_b in parts:
+        if n_b == 0:
+            continue
+        if n == 0:
+            n, mean, m2 = n_b, mean_b, m2_b
+            continue
+        total = n + n_b
+        delta = mean_b - mean
+        mean = mean + delta * (n_b / total)
+        m2 = m2 + m2_b + delta ** 2 * (n * n_b / total)
+        n = total
+    return n, mean, m2
+
+
+def fit_level_2_data_parallel(X_train_l2, y_train, n_workers, C=1.0, tol=1e-6, max_iter=1000):
+    """
+    Fits the same StandardScaler + L2-penalised LogisticRegression as the
+    single-process path, with data split across `n_workers` processes.
+    Returns fitted (model, scaler) objects usable wherever the sklearn ones are.
+    """
+    # Same input validation the single-process LogisticRegression.fit applies
+    X, y = check_X_y(X_train_l2, y_train, dtype=np.float64)
+    classes = np.unique(y)
+    if not np.array_equal(classes, [0.0, 1.0]):
+        raise ValueError(f"Level-2 target must contain both classes 0 and 1, got {classes.tolist()}")
+    if n_workers < 1:
+        raise ValueError(f"n_workers must be >= 1, got {n_workers}")
+    n_features = X.shape[1]
+
+    with ShardPool(X, y, n_workers) as pool:
+        n, mean, m2 = merge_moments(pool.broadcast('moments'))
+        var = m2 / n
+        # StandardScaler leaves constant columns unscaled
+        scale = np.sqrt(var)
+        scale[scale < 10 * np.finfo(np.float64).eps] = 1.0
+        pool.broadcast('standardize', (mean, scale))
+
+        # sklearn's lbfgs objective: C * sum(logloss) + 0.5 * ||w||^2, intercept unpenalised
+        def objective(params):
+            w, b = params[:n_features], params[n_features]
+            loss, grad_w, grad_b = 0.0, np.zeros(n_features), 0.0
+            for part_loss, part_gw, part_gb in pool.broadcast('loss_grad', (w, b)):
+                loss += part_loss
+                grad_w += part_gw
+                grad_b += part_gb
+            value = C * loss + 0.5 * w @ w
+            grad = np.append(C * grad_w + w, C * grad_b)
+            return value, grad
+
+        result = minimize(objective, np.zeros(n_features + 1), jac=True, method='L-BFGS-B',
+                          options={'maxiter': max_iter, 'gtol': tol})
+        if not result.success:
+            raise RuntimeError(f"Level-2 L-BFGS did not converge after {result.nit} iterations: {result.message}")
+
+    scaler = StandardScaler()
+    scaler.mean_ = mean
+    scaler.var_ = var
+    scaler.scale_ = scale
+    scaler.n_samples_seen_ = n
+    scaler.n_features_in_ = n_features
+    if hasattr(X_train_l2, 'columns'):
+        scaler.feature_names_in_ = np.asarray(X_train_l2.columns, dtype=object)
+
+    model = LogisticRegression(random_state=42, C=C)
+    model.classes_ = np.unique(np.asarray(y_train))
+    model.coef_ = result.x[:n_features].reshape(1, -1)
+    model.intercept_ = result.x[n_features:].copy()
+    model.n_features_in_ = n_features
+    model.n_iter_ = np.array([result.nit])
+
+    return model, scaler
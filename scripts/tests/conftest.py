@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The scripts are run directly (python scripts/<name>.py) and import each other
+# as top-level modules, so tests need the same search path.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
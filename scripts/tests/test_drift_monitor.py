@@ -0,0 +1,121 @@
+import json
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.preprocessing import StandardScaler
+
+import drift_monitor as dm
+
+
+FEATURES = ['color_focus_risk', 'routine_sequencer_risk', 'emotion_mirror_risk', 'object_hunt_risk',
+            'age', 'gender', 'jundice', 'austim']
+
+
+def training_matrix(n_rows=20000, seed=0):
+    # Level-1 predict_proba outputs are skewed and bimodal, not Gaussian
+    rng = np.random.default_rng(seed)
+    positive = rng.random((n_rows, 1)) < 0.3
+    risks = np.where(positive, rng.beta(8, 2, (n_rows, 4)), rng.beta(1.2, 9, (n_rows, 4)))
+    age = rng.choice([4.0, 5.0, 6.0, 7.0], size=(n_rows, 1), p=[0.1, 0.2, 0.6, 0.1])
+    flags = (rng.random((n_rows, 3)) < [0.04, 0.015, 0.01]).astype(float)
+    return pd.DataFrame(np.hstack([risks, age, flags]), columns=FEATURES)
+
+
+def monitor_for(X, with_reference=True):
+    scaler = StandardScaler().fit(X)
+    ref = dm.drift_reference(scaler.transform(X))
+    return dm.DriftMonitor(FEATURES, scaler.mean_, scaler.scale_, ref['counts'] if with_reference else None)
+
+
+def write_model(path, X):
+    scaler = StandardScaler().fit(X)
+    path.write_text(json.dumps({'level_2_model': {
+        'feature_names': FEATURES,
+        'scaler_mean': scaler.mean_.tolist(),
+        'scaler_scale': scaler.scale_.tolist(),
+        'drift_reference': dm.drift_reference(scaler.transform(X)),
+    }}))
+
+
+def test_training_data_scores_ok_against_its_own_reference():
+    X = training_matrix()
+    monitor = monitor_for(X)
+    for start in range(0, len(X), 3000):
+        monitor.update(X.iloc[start:start + 3000])
+
+    report = monitor.report()
+    assert report['reference'] == 'training_histogram'
+    assert report['status'] == 'ok'
+    for name, entry in report['features'].items():
+        assert entry['psi'] < 1e-6, name
+        assert entry['ks'] < 1e-6, name
+
+
+def test_gaussian_fallback_is_labelled():
+    X = training_matrix(2000)
+    monitor = monitor_for(X, with_reference=False)
+    monitor.update(X)
+    assert monitor.report()['reference'] == 'gaussian_fallback'
+
+
+def test_shifted_risk_alerts():
+    X = training_matrix()
+    monitor = monitor_for(X)
+    shifted = training_matrix(seed=1)
+    shifted['emotion_mirror_risk'] = np.clip(shifted['emotion_mirror_risk'] + 0.25, 0, 1)
+    monitor.update(shifted)
+
+    report = monitor.report()
+    assert report['features']['emotion_mirror_risk']['status'] == 'alert'
+    assert report['features']['color_focus_risk']['status'] == 'ok'
+    assert report['status'] == 'alert'
+
+
+def test_binary_flags_report_rate_not_quantiles():
+    X = training_matrix()
+    monitor = monitor_for(X)
+    monitor.update(X)
+    entry = monitor.report()['features']['jundice']
+    assert 'quantiles' not in entry
+    assert entry['rate'] == pytest.approx(X['jundice'].mean(), abs=1e-6)
+    assert 'quantiles' in monitor.report()['features']['age']
+
+
+def test_merged_sketches_match_single_stream():
+    X = training_matrix()
+    full, left, right = monitor_for(X), monitor_for(X), monitor_for(X)
+    full.update(X)
+    left.update(X.iloc[:7000])
+    right.update(X.iloc[7000:])
+    merged = dm.DriftMonitor.from_dict(json.loads(json.dumps(left.to_dict()))).merge(right)
+    np.testing.assert_array_equal(merged.z_hist, full.z_hist)
+    np.testing.assert_array_equal(merged.risk_hist, full.risk_hist)
+    np.testing.assert_allclose(merged.mean, full.mean)
+    np.testing.assert_allclose(merged.m2, full.m2)
+    assert merged.report()['features']['age']['psi'] == full.report()['features']['age']['psi']
+
+
+def run_main(monkeypatch, *argv):
+    monkeypatch.setattr(sys, 'argv', ['drift_monitor.py', *argv])
+    dm.main()
+
+
+def test_state_from_another_model_is_refused(tmp_path, monkeypatch):
+    X = training_matrix(3000)
+    batch = tmp_path / 'batch.csv'
+    X.to_csv(batch, index=False)
+    old_model, new_model, state = tmp_path / 'old.json', tmp_path / 'new.json', tmp_path / 'state.json'
+    write_model(old_model, X)
+    write_model(new_model, training_matrix(3000, seed=5))
+
+    run_main(monkeypatch, str(batch), '--model', str(old_model), '--state', str(state))
+    run_main(monkeypatch, str(batch), '--model', str(old_model), '--state', str(state))
+    assert json.loads(state.read_text())['rows'] == 6000
+
+    with pytest.raises(SystemExit, match='--reset-state'):
+        run_main(monkeypatch, str(batch), '--model', str(new_model), '--state', str(state))
+
+    run_main(monkeypatch, str(batch), '--model', str(new_model), '--state', str(state), '--reset-state')
+    assert json.loads(state.read_text())['rows'] == 3000
@@ -0,0 +1,106 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+import explain_batch as eb
+
+
+FEATURES = ['color_focus_risk', 'routine_sequencer_risk', 'emotion_mirror_risk', 'object_hunt_risk',
+            'age', 'gender', 'jundice', 'austim']
+
+
+@pytest.fixture
+def model_file(tmp_path):
+    path = tmp_path / 'model_weights.json'
+    path.write_text(json.dumps({'level_2_model': {
+        'feature_names': FEATURES,
+        'coefficients': [1.5, 1.4, 1.9, 1.4, 0.05, 0.16, 0.04, 0.04],
+        'intercept': -2.5,
+        'scaler_mean': [0.30, 0.31, 0.30, 0.30, 6.36, 0.04, 0.015, 0.009],
+        'scaler_scale': [0.19, 0.23, 0.29, 0.21, 0.54, 0.19, 0.12, 0.09],
+    }}))
+    return path
+
+
+def scored(n_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(rng.random((n_rows, len(FEATURES))), columns=FEATURES)
+    df['age'] = rng.normal(6, 1, n_rows)
+    return df
+
+
+def test_logit_and_top_k_match_reference(model_file):
+    l2 = eb.load_level_2_model(str(model_file))
+    X = scored(5000).to_numpy()
+    contributions, logit, probability, top_idx = eb.explain(X, l2, top_k=3)
+
+    expected = ((X - l2['scaler_mean']) / l2['scaler_scale']) @ l2['coefficients'] + l2['intercept']
+    np.testing.assert_allclose(logit, expected, rtol=0, atol=1e-12)
+    np.testing.assert_allclose(probability, 1 / (1 + np.exp(-expected)), atol=1e-12)
+    np.testing.assert_allclose(contributions.sum(axis=1) + l2['intercept'], logit)
+    np.testing.assert_array_equal(top_idx, np.argsort(-np.abs(contributions), axis=1, kind='stable')[:, :3])
+
+
+def test_top_k_at_least_feature_count(model_file):
+    l2 = eb.load_level_2_model(str(model_file))
+    X = scored(10).to_numpy()
+    contributions, _, _, top_idx = eb.explain(X, l2, top_k=20)
+    assert top_idx.shape == (10, len(FEATURES))
+    ordered = np.take_along_axis(np.abs(contributions), top_idx, axis=1)
+    assert (np.diff(ordered, axis=1) <= 0).all()
+
+
+def test_missing_values_use_predict_risk_defaults(model_file):
+    l2 = eb.load_level_2_model(str(model_file))
+    batch = scored(3)
+    batch.loc[0, 'emotion_mirror_risk'] = np.nan
+    batch.loc[0, 'age'] = np.nan
+    filled = batch.copy()
+    filled.loc[0, 'emotion_mirror_risk'] = 0.3
+    filled.loc[0, 'age'] = 5.0
+
+    table = eb.explanation_table(batch, l2).to_pandas()
+    _, expected_logit, _, _ = eb.explain(filled[FEATURES].to_numpy(), l2)
+    assert table['n_imputed'].tolist() == [2, 0, 0]
+    assert np.isfinite(table['logit']).all()
+    np.testing.assert_allclose(table['logit'], expected_logit, rtol=1e-6)
+
+
+def test_missing_feature_column_is_rejected(model_file):
+    l2 = eb.load_level_2_model(str(model_file))
+    with pytest.raises(ValueError, match='age'):
+        eb.explanation_table(scored(3).drop(columns=['age']), l2)
+
+
+def test_id_column_types_are_stable_across_chunks(tmp_path, model_file):
+    df = scored(6)
+    df.insert(0, 'user_id', ['u1', 'u2', 'u3', None, None, None])
+    df.insert(1, 'child_id', pd.array([1, 2, None, 4, 5, 6], dtype='Int64'))
+    df.to_csv(tmp_path / 'scored.csv', index=False)
+    out = tmp_path / 'explanations.parquet'
+
+    rows = eb.explain_files([str(tmp_path / 'scored.csv')], str(out), str(model_file),
+                            id_columns=['user_id', 'child_id'], chunk_size=3)
+
+    table = pq.read_table(out)
+    assert rows == 6
+    assert table.schema.field('user_id').type == pa.string()
+    assert table.column('user_id').to_pylist() == ['u1', 'u2', 'u3', None, None, None]
+    assert table.column('child_id').to_pylist() == ['1', '2', None, '4', '5', '6']
+    assert table.column('driver_1').type == pa.dictionary(pa.int8(), pa.string())
+
+
+def test_empty_input_writes_empty_file_with_schema(tmp_path, model_file, capsys):
+    pd.DataFrame(columns=['user_id'] + FEATURES).to_csv(tmp_path / 'empty.csv', index=False)
+    out = tmp_path / 'explanations.parquet'
+
+    rows = eb.explain_files([str(tmp_path / 'empty.csv')], str(out), str(model_file), id_columns=['user_id'])
+
+    table = pq.read_table(out)
+    assert rows == 0 and table.num_rows == 0
+    assert {'user_id', 'logit', 'risk_probability', 'age_contrib', 'driver_3'} <= set(table.column_names)
+    assert 'No scored rows' in capsys.readouterr().out
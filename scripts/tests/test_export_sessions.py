@@ -0,0 +1,159 @@
+import json
+import random
+import string
+from datetime import datetime, timezone
+
+import pandas as pd
+import pytest
+
+import export_sessions as es
+
+
+def random_id(rng):
+    return ''.join(rng.choice(string.ascii_letters + string.digits) for _ in range(20))
+
+
+def write_jsonl(root, collection, docs):
+    with open(root / f'{collection}.jsonl', 'w') as f:
+        for doc_id, data in docs.items():
+            f.write(json.dumps({'id': doc_id, 'data': data}) + '\n')
+
+
+def session(game_id='object-id', status='COMPLETE', stats=None, end=True):
+    now = datetime.now(timezone.utc).isoformat()
+    data = {'userId': 'u1', 'gameId': game_id, 'status': status, 'score': 10, 'startTime': now}
+    if end:
+        data['endTime'] = now
+        data['stats'] = stats or {'mistakes': 1, 'completed': True}
+    return data
+
+
+@pytest.fixture
+def sessions():
+    rng = random.Random(7)
+    docs = {random_id(rng): session(game_id=rng.choice(['object-id', 'color-focus'])) for _ in range(300)}
+    docs['local_1700000000000_abc123xyz'] = session()
+    return docs
+
+
+def read_sessions(out):
+    return pd.read_parquet(out / es.SESSIONS_COLLECTION)
+
+
+def run(src, out, **kwargs):
+    kwargs.setdefault('collections', [es.SESSIONS_COLLECTION])
+    kwargs.setdefault('page_size', 17)
+    kwargs.setdefault('n_shards', 4)
+    return es.export_collections(es.FileSource(str(src)), str(out), **kwargs)
+
+
+class FailingSource(es.FileSource):
+    def __init__(self, root, fail_on_call):
+        super().__init__(root)
+        self.calls = 0
+        self.fail_on_call = fail_on_call
+
+    def fetch_page(self, *args):
+        self.calls += 1
+        if self.calls == self.fail_on_call:
+            raise RuntimeError("simulated crash")
+        return super().fetch_page(*args)
+
+
+def test_shards_cover_every_id_exactly_once(sessions):
+    ids = sorted(sessions)
+    for n_shards in (1, 3, 8, 62, 100):
+        covered = []
+        for lower, upper in es.make_shards(n_shards):
+            covered += [i for i in ids if (lower is None or i >= lower) and (upper is None or i < upper)]
+        assert sorted(covered) == ids
+
+
+def test_export_writes_each_document_once(tmp_path, sessions):
+    write_jsonl(tmp_path, es.SESSIONS_COLLECTION, sessions)
+    totals = run(tmp_path, tmp_path / 'out')
+
+    df = read_sessions(tmp_path / 'out')
+    assert totals[es.SESSIONS_COLLECTION] == len(sessions)
+    assert sorted(df['session_id']) == sorted(sessions)
+    assert set(df['game_id'].astype(str)) == {'object-id', 'color-focus'}
+
+
+def test_resume_after_interrupted_page(tmp_path, sessions):
+    write_jsonl(tmp_path, es.SESSIONS_COLLECTION, sessions)
+    out = tmp_path / 'out'
+    with pytest.raises(RuntimeError):
+        es.export_collections(FailingSource(str(tmp_path), fail_on_call=6), str(out),
+                              collections=[es.SESSIONS_COLLECTION], n_shards=1, page_size=17)
+
+    cursor = json.loads((out / es.CURSOR_FILE_NAME).read_text())
+    assert cursor['run']['positions'][es.SESSIONS_COLLECTION]['0']['page'] == 5
+
+    resumed = FailingSource(str(tmp_path), fail_on_call=None)
+    es.export_collections(resumed, str(out), collections=[es.SESSIONS_COLLECTION], n_shards=1, page_size=17)
+    df = read_sessions(out)
+    assert sorted(df['session_id']) == sorted(sessions)
+    # 301 docs / 17 per page = 18 pages; 5 were done before the crash
+    assert resumed.calls == 18 - 5
+
+
+def test_resume_with_different_shard_count_is_refused(tmp_path, sessions):
+    write_jsonl(tmp_path, es.SESSIONS_COLLECTION, sessions)
+    out = tmp_path / 'out'
+    with pytest.raises(RuntimeError):
+        es.export_collections(FailingSource(str(tmp_path), fail_on_call=2), str(out),
+                              collections=[es.SESSIONS_COLLECTION], n_shards=1, page_size=17)
+    with pytest.raises(SystemExit, match='--shards 1'):
+        run(tmp_path, out, n_shards=8)
+    run(tmp_path, out, n_shards=8, fresh=True)
+    assert len(read_sessions(out)) == len(sessions)
+
+
+def test_incremental_run_picks_up_new_and_updated_sessions(tmp_path, sessions):
+    out = tmp_path / 'out'
+    active_id = 'zzzzActiveSession000'
+    sessions[active_id] = session(status='ACTIVE', end=False)
+    write_jsonl(tmp_path, es.SESSIONS_COLLECTION, sessions)
+    run(tmp_path, out)
+    assert read_sessions(out).set_index('session_id').loc[active_id, 'status'] == 'ACTIVE'
+
+    rng = random.Random(99)
+    new_ids = [random_id(rng) for _ in range(50)]
+    for doc_id in new_ids:
+        sessions[doc_id] = session()
+    sessions[active_id] = session(stats={'mistakes': 4, 'completed': True})
+    write_jsonl(tmp_path, es.SESSIONS_COLLECTION, sessions)
+    totals = run(tmp_path, out, lookback_hours=0)
+
+    df = read_sessions(out).set_index('session_id')
+    assert totals[es.SESSIONS_COLLECTION] == 51
+    assert df.index.is_unique
+    assert set(new_ids) <= set(df.index)
+    assert df.loc[active_id, 'status'] == 'COMPLETE'
+    assert df.loc[active_id, 'mistakes'] == 4
+
+
+def test_unchanged_documents_are_not_rewritten(tmp_path, sessions):
+    write_jsonl(tmp_path, es.SESSIONS_COLLECTION, sessions)
+    run(tmp_path, tmp_path / 'out')
+    totals = run(tmp_path, tmp_path / 'out', lookback_hours=0)
+    assert totals[es.SESSIONS_COLLECTION] == 0
+    assert len(read_sessions(tmp_path / 'out')) == len(sessions)
+
+
+@pytest.mark.parametrize('value', [
+    {'seconds': 1700000000, 'nanoseconds': 500_000_000},
+    {'_seconds': 1700000000, '_nanoseconds': 500_000_000},
+    '2023-11-14T22:13:20.500Z',
+    '2023-11-14T22:13:20.500',
+    1700000000500,
+    datetime(2023, 11, 14, 22, 13, 20, 500_000),
+])
+def test_timestamp_coercion(value):
+    ts = es.to_timestamp(value)
+    assert pd.Timestamp(ts) == pd.Timestamp('2023-11-14T22:13:20.500Z')
+
+
+def test_unparseable_timestamp_is_null():
+    assert es.to_timestamp('not a date') is None
+    assert es.to_timestamp({'foo': 1}) is None
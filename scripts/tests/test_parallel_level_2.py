@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+from sklearn.linear_model import LogisticRegression
+from sklearn.preprocessing import StandardScaler
+
+from parallel_level_2 import ShardPool, fit_level_2_data_parallel
+
+
+def synthetic_l2(n_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    risks = rng.beta(2, 5, size=(n_rows, 4))
+    age = rng.normal(6, 0.5, size=(n_rows, 1))
+    flags = (rng.random((n_rows, 3)) < 0.1).astype(float)
+    X = np.hstack([risks, age, flags])
+    logit = 3 * risks.sum(axis=1) - 3 + 0.2 * (age[:, 0] - 6)
+    y = (rng.random(n_rows) < 1 / (1 + np.exp(-logit))).astype(int)
+    y[:2] = [0, 1]
+    return X, y
+
+
+def single_process_fit(X, y):
+    # train_level_2_model's configuration, with a tight tol so the comparison
+    # measures the parallel path rather than sklearn's early stop
+    scaler = StandardScaler()
+    model = LogisticRegression(random_state=42, C=1.0, tol=1e-10, max_iter=10000)
+    model.fit(scaler.fit_transform(X), y)
+    return model, scaler
+
+
+@pytest.mark.parametrize('n_rows, n_workers', [(400, 1), (401, 3), (6, 9)])
+def test_matches_single_process_fit(n_rows, n_workers):
+    X, y = synthetic_l2(n_rows)
+    ref_model, ref_scaler = single_process_fit(X, y)
+    model, scaler = fit_level_2_data_parallel(X, y, n_workers)
+
+    np.testing.assert_allclose(scaler.mean_, ref_scaler.mean_, rtol=1e-10, atol=1e-12)
+    np.testing.assert_allclose(scaler.scale_, ref_scaler.scale_, rtol=1e-10, atol=1e-12)
+    np.testing.assert_allclose(model.coef_, ref_model.coef_, atol=1e-4)
+    np.testing.assert_allclose(model.intercept_, ref_model.intercept_, atol=1e-4)
+    np.testing.assert_array_equal(model.predict(scaler.transform(X)), ref_model.predict(ref_scaler.transform(X)))
+
+
+def test_rejects_non_finite_input():
+    X, y = synthetic_l2(50)
+    X[3, 2] = np.nan
+    with pytest.raises(ValueError, match='NaN'):
+        fit_level_2_data_parallel(X, y, 2)
+
+
+def test_dead_worker_is_reported_with_its_shard():
+    X, y = synthetic_l2(20)
+    with pytest.raises(RuntimeError, match=r'shard 1 \(rows 10:20\) died'):
+        with ShardPool(X, y, 2) as pool:
+            pool.broadcast('moments')
+            pool._procs[1].kill()
+            pool._procs[1].join()
+            pool.broadcast('moments')
+
+
+def test_worker_exception_is_surfaced():
+    X, y = synthetic_l2(20)
+    with pytest.raises(RuntimeError, match=r'shard 0 .* failed during .loss_grad.'):
+        with ShardPool(X, y, 2) as pool:
+            pool.broadcast('loss_grad', (np.zeros(3), 0.0))
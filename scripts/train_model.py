@@ -1,3 +1,4 @@
+import argparse
 import pandas as pd
 import numpy as np
 import json
@@ -10,6 +11,9 @@ from sklearn.linear_model import LogisticRegression
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.metrics import classification_report, confusion_matrix, accuracy_score, precision_score, recall_score, f1_score
 
+from drift_monitor import drift_reference
+from parallel_level_2 import fit_level_2_data_parallel
+
 
 DATASET_PATH = r'DATASETS/asd_children.csv'
 OUTPUT_DIR = r'public/models'
@@ -235,18 +239,23 @@ def train_level_1_models(X_train, y_train, X_test, y_test):
 
 
 
-def train_level_2_model(X_train_l2, y_train, X_test_l2, y_test):
+def train_level_2_model(X_train_l2, y_train, X_test_l2, y_test, n_workers=1):
     print("\n--- Training Level 2 (Global) Model ---")
     
     
-    scaler = StandardScaler()
-    X_train_scaled = scaler.fit_transform(X_train_l2)
-    X_test_scaled = scaler.transform(X_test_l2)
-    
-    
-    
-    model = LogisticRegression(random_state=42, C=1.0)
-    model.fit(X_train_scaled, y_train)
+    if n_workers > 1:
+        print(f"Data-parallel mode: {n_workers} shard workers")
+        model, scaler = fit_level_2_data_parallel(X_train_l2, y_train, n_workers, C=1.0)
+        X_test_scaled = scaler.transform(X_test_l2)
+    else:
+        scaler = StandardScaler()
+        X_train_scaled = scaler.fit_transform(X_train_l2)
+        X_test_scaled = scaler.transform(X_test_l2)
+        
+        
+        
+        model = LogisticRegression(random_state=42, C=1.0)
+        model.fit(X_train_scaled, y_train)
     
     
     y_pred = model.predict(X_test_scaled)
@@ -275,6 +284,10 @@ def train_level_2_model(X_train_l2, y_train, X_test_l2, y_test):
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Train the hierarchical NeuroStep model.")
+    parser.add_argument('--l2-workers', type=int, default=1,
+                        help="Shard the Level-2 fit across this many worker processes")
+    args = parser.parse_args()
     
     X, y = load_and_preprocess()
     if X is None: return
@@ -286,7 +299,7 @@ def main():
     l1_models, l1_scalers, l1_metrics, X_train_l2, X_test_l2 = train_level_1_models(X_train, y_train, X_test, y_test)
     
     
-    l2_model, l2_scaler, l2_metrics, y_pred_final = train_level_2_model(X_train_l2, y_train, X_test_l2, y_test)
+    l2_model, l2_scaler, l2_metrics, y_pred_final = train_level_2_model(X_train_l2, y_train, X_test_l2, y_test, n_workers=args.l2_workers)
     
     
     os.makedirs(OUTPUT_DIR, exist_ok=True)
@@ -339,7 +352,8 @@ def main():
             "intercept": l2_model.intercept_[0],
             "feature_names": l2_feature_names,
             "scaler_mean": l2_scaler.mean_.tolist(),
-            "scaler_scale": l2_scaler.scale_.tolist()
+            "scaler_scale": l2_scaler.scale_.tolist(),
+            "drift_reference": drift_reference(l2_scaler.transform(X_train_l2))
         },
         "level_1_models": l1_metrics 
         